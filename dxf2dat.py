@@ -1,70 +1,131 @@
+import contextlib
+import io
+import mmap
+import os
+
 import ezdxf
+import numpy as np
+from ezdxf import recover
+from ezdxf.addons import iterdxf
+from ezdxf.lldxf.validator import is_binary_dxf_file, is_dxf_file
+
+def _normalize_sort(all_xy, n_upper, le_point, chord_length):
+    # One sort over both surfaces: x ascending, ties broken by drawing order
+    # (reversed for upper, which is read back TE -> LE).
+    index = np.arange(len(all_xy))
+    is_upper = index < n_upper
+    order = np.lexsort((np.where(is_upper, -index, index), all_xy[:, 0]))
+    norm = (all_xy[order] - le_point) / chord_length
+    upper_mask = is_upper[order]
+    return norm[upper_mask][::-1], norm[~upper_mask]
+
+def _format_points(pts):
+    return ("  %.6f  %.6f\n" * len(pts)) % tuple(pts.ravel().tolist())
+
+def _write_selig(f, upper_norm, lower_norm, airfoil_name):
+    combined = np.vstack([upper_norm, lower_norm[1:]])
+    f.write(f"{airfoil_name}\n")
+    f.write(_format_points(combined))
+
+def _write_lednicer(f, upper_norm, lower_norm, airfoil_name):
+    f.write(f"{airfoil_name.upper()} AIRFOIL\n")
+    f.write(f"       {len(upper_norm)}.       {len(lower_norm)}.\n\n")
+    f.write(_format_points(upper_norm[::-1]))
+    f.write("\n")
+    f.write(_format_points(lower_norm))
+
+def _write_file(filename, data):
+    # One raw write of the assembled file, skipping the text I/O layers.
+    # O_BINARY keeps Windows from translating '\n' to '\r\n'.
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    fd = os.open(filename, flags, 0o666)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+WRITERS = {'selig': _write_selig, 'lednicer': _write_lednicer}
+
+def _collect_polylines(entities):
+    polylines = []
+    for entity in entities:
+        if entity.dxftype() == 'LWPOLYLINE':
+            points = np.array(entity.get_points('xy'), dtype=np.float64).reshape(-1, 2)
+        else:
+            points = np.array(list(entity.points()), dtype=np.float64).reshape(-1, 3)[:, :2]
+
+        if len(points):
+            # Column-major so x and y are each contiguous for the reductions below
+            polylines.append(np.asfortranarray(points))
+            if len(polylines) > 2:
+                break
+    return polylines
 
 def extract_airfoil_from_dxf(dxf_filename, output_filename, file_format='selig'):
+    writer = WRITERS.get(file_format)
+    if writer is None:
+        raise ValueError(f"Unknown format '{file_format}', expected one of: {', '.join(WRITERS)}")
+
+    types = ['LWPOLYLINE', 'POLYLINE']
     try:
-        doc = ezdxf.readfile(dxf_filename)
+        if is_binary_dxf_file(dxf_filename):
+            # iterdxf only reads ASCII DXF
+            doc = ezdxf.readfile(dxf_filename)
+            polylines = _collect_polylines(doc.modelspace().query(' '.join(types)))
+        elif not is_dxf_file(dxf_filename):
+            raise IOError(f"File '{dxf_filename}' is not a DXF file")
+        else:
+            try:
+                # Stream modelspace entities instead of loading the whole document
+                with contextlib.closing(iterdxf.opendxf(dxf_filename)) as doc:
+                    polylines = _collect_polylines(doc.modelspace(types=types))
+            except ezdxf.DXFStructureError:
+                # Damaged file: let ezdxf's recover loader repair it, reading the
+                # file through a read-only memory map
+                with open(dxf_filename, 'rb') as fh, \
+                        mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    doc, _ = recover.read(mm)
+                polylines = _collect_polylines(doc.modelspace().query(' '.join(types)))
+                if not polylines:
+                    # Nothing usable survived (e.g. a truncated file)
+                    raise
+                # Recovery skips unreadable tags without reporting them, so
+                # vertices may be missing from the polylines it returns
+                print(f"⚠ Warning: '{dxf_filename}' is damaged and was repaired by ezdxf; "
+                      "the airfoil geometry may be incomplete, check the output before use")
     except IOError:
         raise ValueError(f"File '{dxf_filename}' not found or invalid DXF")
     except ezdxf.DXFStructureError:
         raise ValueError("Invalid DXF file structure")
 
-    msp = doc.modelspace()
-    polylines = []
-
-    for entity in msp:
-        if entity.dxftype() in ('POLYLINE', 'LWPOLYLINE'):
-            points = []
-            if entity.dxftype() == 'LWPOLYLINE':
-                points = [(vertex[0], vertex[1]) for vertex in entity]
-            else:
-                points = [(vertex.dxf.location[0], vertex.dxf.location[1]) 
-                         for vertex in entity.vertices()]
-            
-            if points:
-                polylines.append(points)
-
     if len(polylines) == 2:
-        polylines.sort(key=lambda pts: sum(y for _, y in pts)/len(pts), reverse=True)
-        upper, lower = polylines
+        mean_y = np.array([pts[:, 1].mean() for pts in polylines])
+        upper, lower = (polylines[i] for i in np.argsort(-mean_y, kind='stable'))
     elif len(polylines) == 1:
         all_pts = polylines[0]
-        le_index = min(range(len(all_pts)), key=lambda i: all_pts[i][0])
+        le_index = int(all_pts[:, 0].argmin())
         upper, lower = all_pts[:le_index+1], all_pts[le_index:]
     else:
-        raise ValueError(f"Expected 1-2 polylines, found {len(polylines)}")
-
-    min_x = min(x for x, _ in upper + lower)
-    max_x = max(x for x, _ in upper + lower)
-    le_point = next((x, y) for x, y in upper + lower if x == min_x)
-    chord_length = max_x - min_x
-
-    def normalize(x, y):
-        return ((x - le_point[0]) / chord_length, (y - le_point[1]) / chord_length)
-
-    upper_norm = [normalize(x, y) for x, y in sorted(upper, key=lambda p: -p[0])]
-    lower_norm = [normalize(x, y) for x, y in sorted(lower, key=lambda p: p[0])]
-
-    te_upper = max(upper_norm, key=lambda p: p[0])
-    te_lower = max(lower_norm, key=lambda p: p[0])
-
-    with open(output_filename, 'w') as f:
-        if file_format == 'selig':
-            combined = upper_norm + lower_norm[1:]
-            f.write(f"{output_filename.replace('.dat', '')}\n")
-            for x, y in combined:
-                f.write(f"  {x:.6f}  {y:.6f}\n")
-
-        elif file_format == 'lednicer':
-            f.write(f"{output_filename.replace('.dat', '').upper()} AIRFOIL\n")
-            f.write(f"       {len(upper_norm)}.       {len(lower_norm)}.\n\n")
-            
-            for x, y in reversed(upper_norm):
-                f.write(f"  {x:.6f}  {y:.6f}\n")
-            
-            f.write("\n")
-            
-            for x, y in lower_norm:
-                f.write(f"  {x:.6f}  {y:.6f}\n")
+        found = 'more than 2' if len(polylines) > 2 else len(polylines)
+        raise ValueError(f"Expected 1-2 polylines, found {found}")
+
+    all_xy = np.concatenate([upper, lower], axis=0)
+    le_point = all_xy[all_xy[:, 0].argmin()]
+    chord_length = all_xy[:, 0].max() - le_point[0]
+
+    upper_norm, lower_norm = _normalize_sort(all_xy, len(upper), le_point, chord_length)
+
+    # Upper runs TE -> LE and lower LE -> TE, so the TE points are the ends
+    te_upper = upper_norm[0]
+    te_lower = lower_norm[-1]
+
+    airfoil_name = os.path.splitext(os.path.basename(output_filename))[0]
+
+    buf = io.StringIO()
+    writer(buf, upper_norm, lower_norm, airfoil_name)
+    _write_file(output_filename, buf.getvalue().encode('utf-8'))
 
     print(f"✓ Saved {len(upper_norm)+len(lower_norm)} points to {output_filename}")
     print(f"• LE moved to (0,0), TE at ({te_upper[0]:.4f},{te_upper[1]:.4f}) and ({te_lower[0]:.4f},{te_lower[1]:.4f})")